@@ -1,6 +1,5 @@
 from flask import Flask, request, jsonify
 from src.helpers.compressorModel import Compressor
-import json
 
 app = Flask(__name__)
 compressor = Compressor()
@@ -8,8 +7,7 @@ compressor = Compressor()
 @app.route('/compress', methods=['POST'])
 def compress():
     if request.method == 'POST':
-        data = request.data
-        data = json.loads(data.decode('utf-8'))
+        data = request.get_json(force=True, cache=False)
         dir = data['dir']
         print(dir)
         compressor.compress(dir)
@@ -19,8 +17,7 @@ def compress():
 @app.route('/reconstruct', methods=['POST'])
 def reconstruct():
     if request.method == 'POST':
-        data = request.data
-        data = json.loads(data.decode('utf-8'))
-        for file in data.values():
-            compressor.reconstruct(file, 'reconstructed')
+        data = request.get_json(force=True, cache=False)
+        files = list(data.values())
+        compressor.reconstruct_batch(files, 'reconstructed')
     return jsonify({'Status' : 'Reconstruction completed.'})
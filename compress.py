@@ -7,6 +7,7 @@ import functools
 from pprint import pprint
 from tqdm import tqdm, trange
 from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
 import torch
 import torchvision
@@ -56,6 +57,10 @@ def prepare_model(ckpt_path, input_dir):
         current_args_d=None, prediction=True, strict=False, silent=True)
     model.logger.info('Model loaded from disk.')
 
+    # Mixed precision synthesis transform on GPU, float32 unless enabled in the config
+    if hific_args.mixed_precision_inference is True:
+        model.inference_dtype = utils.get_inference_dtype(device)
+
     # Build probability tables
     model.logger.info('Building hyperprior probability tables...')
     model.Hyperprior.hyperprior_entropy_model.build_tables()
@@ -72,6 +77,10 @@ def prepare_model(ckpt_path, input_dir):
         current_args_d=None, prediction=True, strict=False, silent=True)
     model.logger.info('Model loaded from disk.')
 
+    # Mixed precision synthesis transform on GPU, float32 unless enabled in the config
+    if hific_args.mixed_precision_inference is True:
+        model.inference_dtype = utils.get_inference_dtype(device)
+
     # Build probability tables
     model.logger.info('Building hyperprior probability tables...')
     model.Hyperprior.hyperprior_entropy_model.build_tables()
@@ -85,7 +94,7 @@ def compress_and_save(model, args, data_loader, output_dir):
     device = utils.get_device()
     model.logger.info('Starting compression...')
 
-    with torch.no_grad():
+    with torch.inference_mode():
         for idx, (data, bpp, filenames) in enumerate(tqdm(data_loader), 0):
             data = data.to(device, dtype=torch.float)
             assert data.size(0) == 1, 'Currently only supports saving single images.'
@@ -104,7 +113,8 @@ def load_and_decompress(model, compressed_format_path, out_path):
 
     compressed_output = compression_utils.load_compressed_format(compressed_format_path)
     start_time = time.time()
-    with torch.no_grad():
+    # Inference mode - no autograd state shared between concurrent callers
+    with torch.inference_mode():
         reconstruction = model.decompress(compressed_output)
 
     torchvision.utils.save_image(reconstruction, out_path, normalize=True)
@@ -114,6 +124,30 @@ def load_and_decompress(model, compressed_format_path, out_path):
 
     return reconstruction
 
+def load_and_decompress_batch(model, compressed_format_paths, out_paths, max_workers=None,
+    max_batch_size=hific_args.max_batch_size):
+    # Decompress several images from compressed format on disk, batching generator passes
+
+    compressed_outputs = [compression_utils.load_compressed_format(path) 
+        for path in compressed_format_paths]
+    start_time = time.time()
+
+    # Entropy decoding and PNG encoding run on the pool, overlapping with the 
+    # generator passes. Each batch is written out as soon as it is reconstructed
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        writes = []
+        with torch.inference_mode():
+            for n, reconstruction in model.decompress_batch(compressed_outputs, executor=executor,
+                max_batch_size=max_batch_size):
+                writes.append(executor.submit(torchvision.utils.save_image, 
+                    reconstruction.cpu(), out_paths[n], normalize=True))
+        for write in writes:
+            write.result()
+
+    delta_t = time.time() - start_time
+    model.logger.info('Decoding time: {:.2f} s for {} images'.format(delta_t, len(out_paths)))
+    model.logger.info(f'Reconstructions saved to {os.path.dirname(out_paths[0])}')
+
 def compress_and_decompress(args):
 
     # Reproducibility
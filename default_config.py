@@ -92,6 +92,10 @@ class args(object):
     mixture_components = 4
     latent_channels_DLMM = 64
 
+    # Inference
+    max_batch_size = 4              # Images per generator pass when reconstructing a batch
+    mixed_precision_inference = False  # bf16/fp16 generator on GPU - changes reconstructions
+
 """
 Specialized configs
 """
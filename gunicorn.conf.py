@@ -0,0 +1,12 @@
+# Serve the compression API with one model per worker process:
+#   gunicorn app:app
+# Every worker loads its own model onto the same device - raise 
+# WEB_CONCURRENCY only if memory (GPU memory on CUDA hosts) allows it
+import os
+
+bind = '0.0.0.0:5000'
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 2))
+# Model is loaded at import time, avoid killing workers while it loads
+timeout = 600
@@ -18,18 +18,45 @@ Compressed state is represented as a stack (head, tail)
 import numpy as np
 import torch
 
+from collections import namedtuple
+
 RANS_L = 1 << 31  # the lower bound of the normalisation interval
 
-def empty_message(shape):
-    return (np.full(shape, RANS_L, "uint64"), ())
+# Tail stored in a preallocated buffer with a write index. Arrays are written
+# reversed, so the flattened tail is the reversed buffer.
+BufferStack = namedtuple('BufferStack', ['buffer', 'size'])
+
+def empty_message(shape, use_numpy_buffer=False, capacity=0):
+    """
+    If `use_numpy_buffer` is set, the tail is kept in a np.uint32 buffer of 
+    `capacity` words (grown if exceeded) instead of a chain of tuples, so 
+    renormalization does not allocate a new stack node per push. Messages 
+    sharing a buffer must be used linearly.
+    """
+    head = np.full(shape, RANS_L, "uint64")
+    if use_numpy_buffer is True:
+        return (head, BufferStack(np.empty(max(capacity, 1), dtype=np.uint32), 0))
+    return (head, ())
 
 def stack_extend(stack, arr):
+    if isinstance(stack, BufferStack):
+        buffer, size = stack
+        new_size = size + len(arr)
+        if new_size > len(buffer):
+            buffer = np.resize(buffer, max(new_size, 2 * len(buffer)))
+        buffer[size:new_size] = arr[::-1]
+        return BufferStack(buffer, new_size)
     return arr, stack
 
 def stack_slice(stack, n):
     # Pop elements from message stack if
     # decoded value outside normalisation
     # interval
+    if isinstance(stack, BufferStack):
+        buffer, size = stack
+        assert n <= size, 'Popped past end of message.'
+        return BufferStack(buffer, size - n), buffer[size - n:size][::-1]
+
     slc = []
     while n > 0:
         arr, stack = stack
@@ -99,6 +126,9 @@ def flatten(x):
     """Flatten a vrans state x into a 1d numpy array."""
     head, x = np.ravel(x[0]), x[1]
     out = [np.uint32(head >> 32), np.uint32(head)]
+    if isinstance(x, BufferStack):
+        out.append(x.buffer[:x.size][::-1])
+        return np.concatenate(out)
     while x:
         head, x = x
         out.append(head)
@@ -8,6 +8,12 @@ import autograd.numpy as np
 from autograd import make_vjp
 from autograd.extend import vspace, VSpace
 from collections import namedtuple
+from numpy.lib.stride_tricks import as_strided
+
+try:
+    from numba import njit, prange
+except ImportError:  # Fall back to NumPy copies
+    njit, prange = None, range
 
 from src.helpers import utils
 from src.compression import entropy_coding
@@ -90,8 +96,70 @@ def view_update(data, view_fun):
         return vspace(data).add(data, diff)
     return item, update
 
+def _decompose_blocked_kernel(x, y, block):
+    # y[b, g, hp, wp, c, i, j] = x[b, g * n + c, hp * ph + i, wp * pw + j]
+    # Output is written contiguously while the spatial dims are visited in
+    # (block x block) tiles, so the source rows of every channel touched by a
+    # tile stay cache resident until all of their patches have been copied.
+    B, G, Hp, Wp, n, ph, pw = y.shape
+    block_h, block_w = max(block // ph, 1), max(block // pw, 1)
+    n_row_blocks = (Hp + block_h - 1) // block_h
+
+    for t in prange(B * G * n_row_blocks):
+        b = t // (G * n_row_blocks)
+        g = (t // n_row_blocks) % G
+        hp0 = (t % n_row_blocks) * block_h
+        for wp0 in range(0, Wp, block_w):
+            for hp in range(hp0, min(hp0 + block_h, Hp)):
+                for wp in range(wp0, min(wp0 + block_w, Wp)):
+                    for c in range(n):
+                        for i in range(ph):
+                            for j in range(pw):
+                                y[b, g, hp, wp, c, i, j] = x[b, g * n + c, hp * ph + i, wp * pw + j]
+    return y
+
+if njit is not None:
+    _decompose_blocked_kernel = njit(parallel=True, cache=True)(_decompose_blocked_kernel)
+
+def decompose_blocked(x, n_channels, patch_size=PATCH_SIZE, block=32):
+    """
+    Same output as `decompose` for contiguous int32 arrays, but materializes the
+    patches with a cache-blocked, multithreaded copy instead of a strided 
+    transpose.
+    """
+    B, C, H, W = x.shape
+    ph, pw = patch_size
+
+    unfolded_shape = (B, C // n_channels, H // ph, W // pw, n_channels, ph, pw)
+    y = np.empty(unfolded_shape, dtype=np.int32)
+    y = _decompose_blocked_kernel(x, y, block)
+    y = np.reshape(y, (-1, n_channels, *patch_size))  # (n_patches, n_channels, *patch_size)
+    return y, unfolded_shape
+
+def _decompose_strided(x, n_channels, patch_size=PATCH_SIZE):
+    # Zero-copy equivalent of the unfold in `decompose` for contiguous arrays
+    B, C, H, W = x.shape
+    ph, pw = patch_size
+    sB, sC, sH, sW = x.strides
+
+    if ph > 1 and njit is not None:
+        # Patch rows can never be merged into a single stride - copy required
+        return decompose_blocked(x, n_channels, patch_size)
+
+    unfolded_shape = (B, C // n_channels, H // ph, W // pw, n_channels, ph, pw)
+    y = as_strided(x, shape=unfolded_shape,
+        strides=(sB, sC * n_channels, sH * ph, sW * pw, sC, sH, sW))
+    # Only copies if the patch axes cannot be merged into a single stride
+    y = np.reshape(y, (-1, n_channels, *patch_size))  # (n_patches, n_channels, *patch_size)
+    return y, unfolded_shape
+
 def decompose(x, n_channels, patch_size=PATCH_SIZE):
     # Decompose input x into spatial patches
+    if (isinstance(x, np.ndarray) and x.dtype == np.int32 and x.flags.c_contiguous
+        and x.ndim == 4 and x.shape[1] % n_channels == 0
+        and x.shape[2] % patch_size[0] == 0 and x.shape[3] % patch_size[1] == 0):
+        return _decompose_strided(x, n_channels, patch_size)
+
     if isinstance(x, torch.Tensor) is False:
         x = torch.Tensor(x)
 
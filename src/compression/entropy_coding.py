@@ -8,13 +8,20 @@ Craystack ANS implementation: https://github.com/j-towns/craystack/blob/master/c
 OVERFLOW_WIDTH = 4
 OVERFLOW_CODE = 1 << (1 << OVERFLOW_WIDTH)
 PATCH_SIZE = (1,1)
+DEBUG = False  # Check coder invariants - costs extra passes over the data
 
 import torch
+import functools
 import numpy as np
 
 from warnings import warn
 from collections import namedtuple
 
+try:
+    from numba import njit
+except ImportError:  # Fall back to the pure NumPy coders
+    njit = None
+
 # Custom
 from src.helpers import maths, utils
 from src.compression import ans as vrans
@@ -23,53 +30,87 @@ from src.compression import compression_utils
 Codec = namedtuple('Codec', ['push', 'pop'])
 cast2u64 = lambda x: np.array(x, dtype=np.uint64)
 
-def base_codec(enc_statfun, dec_statfun, precision, log=False):
-    if np.any(precision >= 24):
-        warn('Detected precision over 28. Codecs lose accuracy at high '
-             'precision.')
+def cdf_dtype(precision):
+    # Narrowest unsigned type holding the CDF total 2^precision - smaller
+    # tables cut the memory traffic of the `cdf[indices, values]` gathers
+    return np.uint16 if precision < 16 else np.uint32
 
+# Typed constants for the JIT-compiled scalar coders
+_RANS_L = np.uint64(vrans.RANS_L)
+_SHIFT32 = np.uint64(32)
+_MASK32 = np.uint64((1 << 32) - 1)
+
+def _jit(fun):
+    # Compile with Numba when available, otherwise leave as plain Python
+    if njit is None:
+        return fun
+    return njit(cache=True)(fun)
+
+def build_push(enc_statfun, precision):
+    # Single push closure for hot loops, see `base_codec`
     def push(message, symbol):
         start, freq = enc_statfun(symbol)
         return vrans.push(message, start, freq, precision)
 
-    def pop(message, log=log):
+    return push
+
+def build_pop(enc_statfun, dec_statfun, precision):
+    # Single pop closure for hot loops, see `base_codec`
+    def pop(message):
         cf, pop_fun = vrans.pop(message, precision)
         symbol = dec_statfun(cf)
         start, freq = enc_statfun(symbol)
-        assert np.all(start <= cf) and np.all(cf < start + freq)
+        if DEBUG:
+            assert np.all(start <= cf) and np.all(cf < start + freq)
         return pop_fun(start, freq), symbol
 
-    return Codec(push, pop)
+    return pop
+
+def base_codec(enc_statfun, dec_statfun, precision, log=False):
+    if np.any(precision >= 24):
+        warn('Detected precision over 28. Codecs lose accuracy at high '
+             'precision.')
+
+    return Codec(build_push(enc_statfun, precision), 
+        build_pop(enc_statfun, dec_statfun, precision))
 
 def _indexed_cdf_to_enc_statfun(cdf_i):
     # enc_statfun: symbol |-> start, freq
     def _enc_statfun(value):
-        # Value in [0, max_length]
+        # Value in [0, max_length], signed integer index from `_dec_statfun`
         lower = cdf_i[value]
         # cum_freq, pmf @ value
-        return lower, cdf_i[int(value + np.uint64(1))] - lower
-            
+        return lower, cdf_i[value + 1] - lower
+
     return _enc_statfun
 
-def _vec_indexed_cdf_to_enc_statfun(cdf_i):
+def _vec_indexed_cdf_to_enc_statfun(cdf_i, rows=None):
     # enc_statfun: symbol |-> start, freq
+    cdf_i_flat = np.reshape(cdf_i, (-1, cdf_i.shape[-1]))
+    if rows is not None:
+        # Index rows of the full CDF table, no per-patch copy of the CDFs
+        flat_rows = np.reshape(rows, -1)
+    else:
+        # A single CDF row is broadcast against all values
+        flat_rows = np.arange(cdf_i_flat.shape[0]) if cdf_i_flat.shape[0] > 1 else 0
+
     def _enc_statfun(value):
         # (coding_shape) = (C,H,W) by default but canbe generalized
         # cdf_i: [(coding_shape), pmf_length + 2]
         # value: [(coding_shape)]
-        lower = np.take_along_axis(cdf_i, 
-            np.expand_dims(value, -1), axis=-1)[..., 0]
-        upper = np.take_along_axis(cdf_i, 
-            np.expand_dims(value + 1, -1), axis=-1)[..., 0]
-        return lower, upper - lower
+        value_flat = np.reshape(value, -1)
+        lower = cdf_i_flat[flat_rows, value_flat]
+        upper = cdf_i_flat[flat_rows, value_flat + 1]
+        return np.reshape(lower, value.shape), np.reshape(upper - lower, value.shape)
 
     return _enc_statfun
 
 def _indexed_cdf_to_dec_statfun(cdf_i, cdf_i_length):
     # dec_statfun: cf |-> symbol
     cdf_i = cdf_i[:cdf_i_length]
-    term = cdf_i[-1]
-    assert term == OVERFLOW_CODE or term == 1 << OVERFLOW_WIDTH, (
+    term = int(cdf_i[-1])
+    # CDF total 2^precision, for any precision
+    assert term > 0 and term & (term - 1) == 0, (
         f"{cdf_i[-1]} expected to be overflow value."
     )
 
@@ -80,30 +121,109 @@ def _indexed_cdf_to_dec_statfun(cdf_i, cdf_i_length):
 
     return _dec_statfun
 
-def _vec_indexed_cdf_to_dec_statfun(cdf_i, cdf_i_length):
-    # dec_statfun: cf |-> symbol
-    *coding_shape, max_cdf_length = cdf_i.shape
-    coding_shape = tuple(coding_shape)
-    cdf_i_flat = np.reshape(cdf_i, (-1, max_cdf_length))
+def _pad_cdf_table(cdf, cdf_length):
+    # Pad each CDF row past its length with a sentinel larger than any cum_freq,
+    # so rows of different lengths can be searched together. Built once per call
+    # over the CDF table - patches index into it by row
+    sentinel = np.iinfo(np.uint64).max
+    return np.where(np.arange(cdf.shape[-1]) < np.reshape(cdf_length, (-1, 1)),
+        cast2u64(cdf), sentinel)
 
-    cdf_i_flat_ragged = [c[:l] for (c,l) in zip(cdf_i_flat, 
-        cdf_i_length.flatten())]
+def _vec_indexed_cdf_to_dec_statfun(cdf_padded, rows):
+    # dec_statfun: cf |-> symbol
+    # cdf_padded: output of `_pad_cdf_table`, rows: [(coding_shape)] CDF indices
+    coding_shape = rows.shape
+    max_cdf_length = cdf_padded.shape[-1]
+    rows = np.reshape(rows, -1)
 
     def _dec_statfun(value):
         # (coding_shape) = (C,H,W) by default but can be generalized
-        # cdf_i: [(coding_shape), pmf_length + 2]
         # value: [(coding_shape)]
         assert value.shape == coding_shape, (
             f"CDF-value shape mismatch! {value.shape} v. {coding_shape}")
-        sym_flat = np.array(
-            [np.searchsorted(cb, v_i, 'right') - 1 for (cb, v_i) in 
-                zip(cdf_i_flat_ragged, value.flatten())])
+
+        # Branchless uniform binary search over all rows at once - finds
+        # s such that CDF[s] <= cum_freq < CDF[s+1]
+        value_flat = cast2u64(value).flatten()
+        sym_flat = np.zeros(len(rows), dtype=np.int64)
+        n = max_cdf_length
+        while n > 1:
+            half = n // 2
+            probe = sym_flat + half
+            sym_flat = np.where(cdf_padded[rows, probe] <= value_flat, probe, sym_flat)
+            n -= half
 
         sym = np.reshape(sym_flat, coding_shape)
         return sym  # (coding_shape)
 
     return _dec_statfun
 
+@functools.lru_cache(maxsize=None)
+def _overflow_codec(overflow_width, vectorize=False):
+    # Overflow codec only depends on `overflow_width` - build once and reuse
+    overflow_cdf_size = (1 << overflow_width) + 1
+    overflow_cdf = np.arange(overflow_cdf_size, dtype=np.uint64)
+
+    if vectorize is True:
+        overflow_cdf = overflow_cdf[None, :]
+        enc_statfun_overflow = _vec_indexed_cdf_to_enc_statfun(overflow_cdf)
+        dec_statfun_overflow = _vec_indexed_cdf_to_dec_statfun(
+            _pad_cdf_table(overflow_cdf, overflow_cdf_size), np.zeros(1, dtype=np.int64))
+    else:
+        enc_statfun_overflow = _indexed_cdf_to_enc_statfun(overflow_cdf)
+        dec_statfun_overflow = _indexed_cdf_to_dec_statfun(overflow_cdf,
+            len(overflow_cdf))
+
+    return base_codec(enc_statfun_overflow, dec_statfun_overflow, overflow_width)
+
+def _map_overflow(values, max_value):
+    """
+    Maps shifted `values` outside of [0, max_value) to `max_value` and returns
+    the non-negative integer overflow to be coded with a variable length code:
+    2 * (value - max_value) above the range, -2 * value - 1 below it. Computed 
+    branchlessly as the zigzag code of the distance to the clipped value.
+    """
+    mapped = np.clip(values, 0, max_value).astype(values.dtype, copy=False)
+    distance = values - mapped
+    sign = distance >> (8 * distance.dtype.itemsize - 1)  # -1 below range, else 0
+    # Values below the range are clipped to 0, move them to `max_value`
+    mapped += max_value & sign
+    overflow = (distance << 1) ^ sign
+    return mapped, overflow
+
+def _unmap_overflow(overflow, max_value):
+    # Inverse of `_map_overflow` for decoded overflow (int64)
+    distance = (overflow >> 1) ^ -(overflow & 1)
+    return distance + (max_value & ~(distance >> 63))
+
+def _overflow_codes(overflow, overflow_width):
+    """
+    Variable length code for the 1-D array of non-negative integers `overflow`,
+    computed for all entries at once. Each entry is coded as its number of 
+    `overflow_width`-bit chunks (`widths`), written as a run of `max_overflow` 
+    codes terminated by the remainder, followed by the chunks themselves, least 
+    significant first.
+
+    Returns the padded (n, max_width_codes) width codes, (n, max_widths) chunks 
+    and `widths`, all int64. Padding entries are zero.
+    """
+    max_overflow = (1 << overflow_width) - 1
+    overflow = cast2u64(overflow)
+
+    max_chunks = -(-64 // overflow_width)
+    shifts = np.arange(max_chunks, dtype=np.uint64) * np.uint64(overflow_width)
+    shifted = overflow[:, None] >> shifts  # [n, max_chunks]
+    widths = np.sum(shifted != 0, axis=1)
+    max_widths = int(np.max(widths, initial=0))
+    chunks = (shifted[:, :max_widths] & np.uint64(max_overflow)).astype(np.int64)
+
+    n_max_codes = widths // max_overflow
+    r = np.arange(int(np.max(n_max_codes, initial=0)) + 1)
+    width_codes = np.where(r < n_max_codes[:, None], max_overflow,
+        np.where(r == n_max_codes[:, None], (widths % max_overflow)[:, None], 0))
+
+    return width_codes, chunks, widths
+
 def ans_index_buffered_encoder(symbols, indices, cdf, cdf_length, cdf_offset, precision, 
     overflow_width=OVERFLOW_WIDTH, **kwargs):
 
@@ -157,100 +277,124 @@ def ans_index_buffered_encoder(symbols, indices, cdf, cdf_length, cdf_offset, pr
     cdf <-> cdf_offset <-> cdf_length
     """
 
-    instructions = []
-
     coding_shape = symbols.shape[1:]
     symbols = symbols.astype(np.int32).flatten()
     indices = indices.astype(np.int32).flatten()
+    cdf_index = indices
 
     max_overflow = (1 << overflow_width) - 1
     overflow_cdf_size = (1 << overflow_width) + 1
     overflow_cdf = np.arange(overflow_cdf_size, dtype=np.uint64)
 
-    enc_statfun_overflow = _indexed_cdf_to_enc_statfun(overflow_cdf)
-    dec_statfun_overflow = _indexed_cdf_to_dec_statfun(overflow_cdf,
-        len(overflow_cdf))
-    overflow_push, overflow_pop = base_codec(enc_statfun_overflow,
-        dec_statfun_overflow, overflow_width)
-
-    # LIFO - last item in buffer is first item decompressed
-    for i in range(len(indices)):  # loop over flattened axis
-
-        cdf_index = indices[i]
-        cdf_i = cdf[cdf_index]
-        cdf_length_i = cdf_length[cdf_index]
-
-        assert (cdf_index >= 0 and cdf_index < cdf.shape[0]), (
-            f"Invalid index {cdf_index} for symbol {i}")
-
-        max_value = cdf_length_i - 2
+    assert bool(np.all(cdf_index >= 0)) and bool(np.all(cdf_index < cdf.shape[0])), (
+        "Invalid index.")
 
-        assert max_value >= 0 and max_value < cdf.shape[1] - 1, (
-            f"Invalid max length {max_value} for symbol {i}")
+    max_value = cdf_length[cdf_index] - 2
 
-        # Data in range [offset[cdf_index], offset[cdf_index] + m - 2] is ANS-encoded
-        # Map values with tracked probabilities to range [0, ..., max_value]
-        value = symbols[i]
-        value -= cdf_offset[cdf_index]
+    assert bool(np.all(max_value >= 0)) and bool(np.all(max_value < cdf.shape[1] - 1)), (
+        "Invalid max length.")
 
-        # If outside of this range, map value to non-negative integer overflow.
-        overflow = 0
-        if (value < 0):
-            overflow = -2 * value - 1
-            value = max_value
-        elif (value >= max_value):
-            overflow = 2 * (value - max_value)
-            value = max_value
+    # Data in range [offset[cdf_index], offset[cdf_index] + m - 2] is ANS-encoded
+    # Map values with tracked probabilities to range [0, ..., max_value]
+    values = symbols - cdf_offset[cdf_index]
 
-        assert value >= 0 and value < cdf_length_i - 1, (
-            f"Invalid shifted value {value} for symbol {i} w/ "
-            f"cdf_length {cdf_length[cdf_index]}")
+    # If outside of this range, map value to non-negative integer overflow.
+    values, overflow = _map_overflow(values, max_value)
+
+    if DEBUG:
+        assert bool(np.all(values >= 0)) and bool(np.all(values < max_value + 1)), (
+            "Invalid shifted value for current symbol.")
+
+    # Bin of discrete CDF that each value belongs to - single gather over all symbols
+    starts = cast2u64(cdf[cdf_index, values])
+    freqs = cast2u64(cdf[cdf_index, values + 1]) - starts
+
+    # When value is outside of the given interval, the overflow value is encoded,
+    # followed by a variable-length encoding of the actual data value. Only the
+    # (sparse) overflowed symbols are coded here.
+    of_idx = np.flatnonzero(values == max_value)
+    width_codes, chunks, widths = _overflow_codes(overflow[of_idx], overflow_width)
+
+    # Drop padding - row-major order gives the codes of each symbol in sequence
+    n_width_codes = widths // max_overflow + 1
+    codes = np.concatenate((width_codes, chunks), axis=1)
+    codes_mask = np.concatenate((
+        np.arange(width_codes.shape[1]) < n_width_codes[:, None],
+        np.arange(chunks.shape[1]) < widths[:, None]), axis=1)
+    overflow_codes = codes[codes_mask]
+    n_codes = np.sum(codes_mask, axis=1)
+
+    # Interleave overflow codes directly after their symbol
+    counts = np.ones(len(values), dtype=np.int64)
+    counts[of_idx] += n_codes
+    symbol_pos = np.cumsum(counts) - counts
+
+    n_instructions = int(np.sum(counts))
+    instruction_starts = np.empty(n_instructions, dtype=np.uint64)
+    instruction_freqs = np.empty(n_instructions, dtype=np.uint64)
+    is_overflow = np.ones(n_instructions, dtype=bool)
+
+    instruction_starts[symbol_pos] = starts
+    instruction_freqs[symbol_pos] = freqs
+    is_overflow[symbol_pos] = False
+
+    instruction_starts[is_overflow] = overflow_cdf[overflow_codes]
+    instruction_freqs[is_overflow] = overflow_cdf[overflow_codes + 1] - overflow_cdf[overflow_codes]
+
+    instructions = (instruction_starts, instruction_freqs, is_overflow)
 
-        # Bin of discrete CDF that value belongs to
-        enc_statfun = _indexed_cdf_to_enc_statfun(cdf_i)
-        dec_statfun = _indexed_cdf_to_dec_statfun(cdf_i, cdf_length_i)
-        symbol_push, symbol_pop = base_codec(enc_statfun, dec_statfun, precision)
+    return instructions, coding_shape
 
-        start, freq = enc_statfun(value)
-        instructions.append((start, freq, False))
+@_jit
+def _ans_index_encoder_flush_kernel(starts, freqs, precisions):
+    # Scalar rANS encoder, ryg_rans layout. Renormalization emits at most one
+    # word per push, so the buffer is bounded by the number of instructions.
+    head = _RANS_L
+    buffer = np.empty(len(starts), dtype=np.uint32)
+    n = 0
 
-        # When value is outside of the given interval, the overflow value is encoded,
-        # followed by a variable-length encoding of the actual data value.
-        if value == max_value:
-            # pass
-            widths = 0
-            while ((overflow >> (widths * overflow_width)) != 0):
-                widths += 1
-
-            val = widths
-            while (val >= max_overflow):
-                start, freq = enc_statfun_overflow(cast2u64(max_overflow))
-                instructions.append((start, freq, True))
-                val -= max_overflow
-            
-            start, freq = enc_statfun_overflow(cast2u64(val))
-            instructions.append((start, freq, True))
+    # LIFO - last item compressed is first item decompressed
+    for i in range(len(starts) - 1, -1, -1):
+        start = np.uint64(starts[i])
+        freq = np.uint64(freqs[i])
+        precision = np.uint64(precisions[i])
+
+        x_max = ((_RANS_L >> precision) << _SHIFT32) * freq
+        if head >= x_max:
+            buffer[n] = np.uint32(head & _MASK32)
+            n += 1
+            head = head >> _SHIFT32
+        head = ((head // freq) << precision) + head % freq + start
+
+    # Same layout as `vrans.flatten` - head, then most recently pushed words first
+    encoded = np.empty(n + 2, dtype=np.uint32)
+    encoded[0] = np.uint32(head >> _SHIFT32)
+    encoded[1] = np.uint32(head & _MASK32)
+    for j in range(n):
+        encoded[j + 2] = buffer[n - 1 - j]
+    return encoded
 
-            for j in range(widths):
-                val = (overflow >> (j * overflow_width)) & max_overflow
-                start, freq = enc_statfun_overflow(cast2u64(val))
-                instructions.append((start, freq, True))
+def ans_index_encoder_flush(instructions, precision, overflow_width=OVERFLOW_WIDTH, **kwargs):
 
-    return instructions, coding_shape
+    starts, freqs, is_overflow = instructions
 
-def ans_index_encoder_flush(instructions, precision, overflow_width=OVERFLOW_WIDTH, **kwargs):
+    if njit is not None:
+        precisions = np.where(is_overflow, overflow_width, precision).astype(np.int64)
+        encoded = _ans_index_encoder_flush_kernel(starts, freqs, precisions)
+        message_length = len(encoded)
+        print('Symbol compressed to {:.3f} bits.'.format(32 * message_length))
+        return encoded
 
-    message = vrans.empty_message(())
+    # At most one word is renormalized out per push
+    message = vrans.empty_message((), use_numpy_buffer=True, capacity=len(starts))
 
     # LIFO - last item compressed is first item decompressed
-    for i in reversed(range(len(instructions))):
-        
-        start, freq, flag = instructions[i]
+    for i in reversed(range(len(starts))):
 
-        if flag is False:
-            message = vrans.push(message, start, freq, precision)
+        if is_overflow[i]:
+            message = vrans.push(message, starts[i], freqs[i], overflow_width)
         else:
-            message = vrans.push(message, start, freq, overflow_width)
+            message = vrans.push(message, starts[i], freqs[i], precision)
 
     encoded = vrans.flatten(message)
     message_length = len(encoded)
@@ -285,20 +429,16 @@ def vec_ans_index_buffered_encoder(symbols, indices, cdf, cdf_length, cdf_offset
     indices = indices.astype(np.int32)
     cdf_index = indices
 
-    max_overflow = (1 << overflow_width) - 1
     overflow_cdf_size = (1 << overflow_width) + 1
-    overflow_cdf = np.arange(overflow_cdf_size, dtype=np.uint64)[None, None, None, :]
+    overflow_cdf = np.arange(overflow_cdf_size, dtype=np.uint64)[None, :]
 
     enc_statfun_overflow = _vec_indexed_cdf_to_enc_statfun(overflow_cdf)
-    dec_statfun_overflow = _vec_indexed_cdf_to_dec_statfun(overflow_cdf,
-        np.ones_like(overflow_cdf) * len(overflow_cdf))
-    overflow_push, overflow_pop = base_codec(enc_statfun_overflow,
-        dec_statfun_overflow, overflow_width)
 
     assert bool(np.all(cdf_index >= 0)) and bool(np.all(cdf_index < cdf.shape[0])), (
         "Invalid index.")
 
-    max_value = cdf_length[cdf_index] - 2
+    cdf_len = cdf_length[cdf_index]
+    max_value = cdf_len - 2
 
     assert bool(np.all(max_value >= 0)) and bool(np.all(max_value < cdf.shape[1] - 1)), (
         "Invalid max length.")
@@ -307,18 +447,14 @@ def vec_ans_index_buffered_encoder(symbols, indices, cdf, cdf_length, cdf_offset
     values = symbols - cdf_offset[cdf_index]
 
     # If outside of this range, map value to non-negative integer overflow.
-    overflow = np.zeros_like(values)
-    of_mask_lower = values < 0
-    overflow = np.where(of_mask_lower, -2 * values - 1, overflow)
-    of_mask_upper = values >= max_value
-    overflow = np.where(of_mask_upper, 2 * (values - max_value), overflow)
-    values = np.where(np.logical_or(of_mask_lower, of_mask_upper), max_value, values)
+    values, overflow = _map_overflow(values, max_value)
 
-    assert bool(np.all(values >= 0)), (
-        "Invalid shifted value for current symbol - values must be non-negative.")
+    if DEBUG:
+        assert bool(np.all(values >= 0)), (
+            "Invalid shifted value for current symbol - values must be non-negative.")
 
-    assert bool(np.all(values < cdf_length[cdf_index] - 1)), (
-        "Invalid shifted value for current symbol - outside cdf index bounds.")
+        assert bool(np.all(values < cdf_len - 1)), (
+            "Invalid shifted value for current symbol - outside cdf index bounds.")
 
     if B == 1:
         # Vectorize on patches - there's probably a way to interlace patches with
@@ -346,68 +482,28 @@ def vec_ans_index_buffered_encoder(symbols, indices, cdf, cdf_length, cdf_offset
         # Bin of discrete CDF that value belongs to
         value_i = values[i]
         cdf_index_i = cdf_index[i]        
-        cdf_i = cdf[cdf_index_i]
         cdf_length_i = cdf_length[cdf_index_i]
         max_value_i = cdf_length_i - 2
 
-        enc_statfun = _vec_indexed_cdf_to_enc_statfun(cdf_i)
-        dec_statfun = _vec_indexed_cdf_to_dec_statfun(cdf_i, cdf_length_i)
-        symbol_push, symbol_pop = base_codec(enc_statfun, dec_statfun, precision)
+        enc_statfun = _vec_indexed_cdf_to_enc_statfun(cdf, cdf_index_i)
 
         start, freq = enc_statfun(value_i)
         instructions.append((start, freq, False, precision, 0))
 
         """
-        Encode overflows here
+        Encode overflows here - variable length codes for all overflowed symbols
+        in the patch are pushed together on the masked substack, padded lanes
+        push a zero code which is ignored by the decoder.
         """
-        # No-op
-        empty_start = np.zeros_like(value_i).astype(np.uint)
-        empty_freq = np.ones_like(value_i).astype(np.uint)
-
         overflow_i = overflow[i]
         of_mask = value_i == max_value_i
 
         if np.any(of_mask):
+            width_codes, chunks, _ = _overflow_codes(overflow_i[of_mask], overflow_width)
 
-            widths = np.zeros_like(value_i)
-            cond_mask = (overflow_i >> (widths * overflow_width)) != 0
-
-            while np.any(cond_mask):
-                widths = np.where(cond_mask, widths+1, widths)
-                cond_mask = (overflow_i >> (widths * overflow_width)) != 0
-
-            val = widths
-            cond_mask = val >= max_overflow
-            while np.any(cond_mask):
-                print('Warning: Undefined behaviour.')
-                val_push = cast2u64(max_overflow)
-                overflow_start, overflow_freq = enc_statfun_overflow(val_push)
-                start = overflow_start[of_mask]
-                freq = overflow_start[of_mask]
+            for codes in (*width_codes.T, *chunks.T):
+                start, freq = enc_statfun_overflow(codes)
                 instructions.append((start, freq, True, int(overflow_width), of_mask))
-                # val[cond_mask] -= max_overflow
-                val = np.where(cond_mask, val-max_overflow, val)
-                cond_mask = val >= max_overflow
-
-            val_push = cast2u64(val)
-            overflow_start, overflow_freq = enc_statfun_overflow(val_push)
-            start = overflow_start[of_mask]
-            freq = overflow_freq[of_mask]
-            instructions.append((start, freq, True, int(overflow_width), of_mask))
-
-            cond_mask = widths != 0
-            while np.any(cond_mask):
-                counter = 0
-                encoding = (overflow_i >> (counter * overflow_width)) & max_overflow
-                val = np.where(cond_mask, encoding, val)
-                val_push = cast2u64(val)
-                overflow_start, overflow_freq = enc_statfun_overflow(val_push)
-                start = overflow_start[of_mask]
-                freq = overflow_freq[of_mask]
-                instructions.append((start, freq, True, int(overflow_width), of_mask))
-                widths = np.where(cond_mask, widths-1, widths)
-                cond_mask = widths != 0
-                counter += 1
 
     return instructions, coding_shape
 
@@ -438,7 +534,8 @@ def substack(codec, view_fun):
         symbol = cf
         start, freq = symbol, 1
         
-        assert np.all(start <= cf) and np.all(cf < start + freq)
+        if DEBUG:
+            assert np.all(start <= cf) and np.all(cf < start + freq)
         (subhead, tail), data = pop_fun(start, freq), symbol
         updated_head = update(subhead)
         return (updated_head, tail), data
@@ -447,7 +544,9 @@ def substack(codec, view_fun):
 
 def vec_ans_index_encoder_flush(instructions, precision, coding_shape, overflow_width=OVERFLOW_WIDTH, **kwargs):
 
-    message = vrans.empty_message(coding_shape)
+    # At most one word per lane is renormalized out per push
+    capacity = sum(np.size(instruction[0]) for instruction in instructions)
+    message = vrans.empty_message(coding_shape, use_numpy_buffer=True, capacity=capacity)
     overflow_push, _ = substack(codec=None, view_fun=overflow_view)
     # LIFO - last item compressed is first item decompressed
     for i in reversed(range(len(instructions))):
@@ -476,6 +575,85 @@ def vec_ans_index_encoder(symbols, indices, cdf, cdf_length, cdf_offset, precisi
 
     return encoded, coding_shape
 
+@_jit
+def _rans_pop(head, encoded, pos, start, freq, precision):
+    # Scalar rANS pop - returns updated state and read position in `encoded`
+    head = freq * (head >> precision) + (head & ((np.uint64(1) << precision) - np.uint64(1))) - start
+    if head < _RANS_L:
+        # Numba does not bounds-check reads - a truncated stream must not
+        # run past the end of `encoded`
+        if pos >= len(encoded):
+            raise ValueError('Popped past end of message.')
+        head = (head << _SHIFT32) | np.uint64(encoded[pos])
+        pos += 1
+    return head, pos
+
+@_jit
+def _ans_index_decoder_kernel(encoded, indices, cdf, cdf_length, cdf_offset, precision,
+    overflow_width, decoded):
+
+    precision = np.uint64(precision)
+    overflow_precision = np.uint64(overflow_width)
+    max_overflow = (1 << overflow_width) - 1
+
+    if len(encoded) < 2:
+        raise ValueError('Message shorter than the rANS head.')
+    head = (np.uint64(encoded[0]) << _SHIFT32) | np.uint64(encoded[1])
+    pos = 2
+
+    for i in range(len(indices)):
+        cdf_index = indices[i]
+        cdf_length_i = cdf_length[cdf_index]
+        max_value = cdf_length_i - 2
+
+        # Search such that CDF[s] <= cum_freq < CDF[s+1]
+        cum_freq = head & ((np.uint64(1) << precision) - np.uint64(1))
+        lo, hi = 0, cdf_length_i - 1
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if np.uint64(cdf[cdf_index, mid]) <= cum_freq:
+                lo = mid
+            else:
+                hi = mid
+        value = lo
+
+        start = np.uint64(cdf[cdf_index, value])
+        freq = np.uint64(cdf[cdf_index, value + 1]) - start
+        head, pos = _rans_pop(head, encoded, pos, start, freq, precision)
+
+        if value == max_value:
+            # Overflow CDF is the identity, i.e. start = symbol and freq = 1
+            val = np.int64(head & np.uint64(max_overflow))
+            head, pos = _rans_pop(head, encoded, pos, np.uint64(val), np.uint64(1),
+                overflow_precision)
+            widths = val
+
+            while val == max_overflow:
+                val = np.int64(head & np.uint64(max_overflow))
+                head, pos = _rans_pop(head, encoded, pos, np.uint64(val), np.uint64(1),
+                    overflow_precision)
+                widths += val
+
+            overflow = 0
+            for j in range(widths):
+                val = np.int64(head & np.uint64(max_overflow))
+                head, pos = _rans_pop(head, encoded, pos, np.uint64(val), np.uint64(1),
+                    overflow_precision)
+                overflow |= val << (j * overflow_width)
+
+            # Map positive values back to integer values, branchless
+            distance = (overflow >> 1) ^ -(overflow & 1)
+            value = distance + (max_value & ~(distance >> 63))
+
+        decoded[i] = value + cdf_offset[cdf_index]
+
+    # The encoder starts from head = RANS_L and an empty tail, a valid stream
+    # decodes back to exactly that state
+    if pos != len(encoded) or head != _RANS_L:
+        raise ValueError('Corrupt message - decoder did not end in the initial state.')
+
+    return decoded
+
 def ans_index_decoder(encoded, indices, cdf, cdf_length, cdf_offset, precision,
     coding_shape, overflow_width=OVERFLOW_WIDTH, **kwargs):
 
@@ -488,39 +666,50 @@ def ans_index_decoder(encoded, indices, cdf, cdf_length, cdf_offset, precision,
     tensor.
     """
 
-    message = vrans.unflatten_scalar(encoded)  # (head, tail)
-    decoded = np.empty(indices.shape).flatten()
+    decoded = np.empty(indices.size, dtype=np.int32)
     indices = indices.astype(np.int32).flatten()
 
+    if njit is not None:
+        assert bool(np.all(indices >= 0)) and bool(np.all(indices < cdf.shape[0])), (
+            "Invalid index.")
+        max_value = cdf_length - 2
+        assert bool(np.all(max_value >= 0)) and bool(np.all(max_value < cdf.shape[1] - 1)), (
+            "Invalid max length.")
+
+        return _ans_index_decoder_kernel(np.asarray(encoded, dtype=np.uint32), indices, cdf,
+            cdf_length, cdf_offset, precision, overflow_width, decoded)
+
+    message = vrans.unflatten_scalar(encoded)  # (head, tail)
+
     max_overflow = (1 << overflow_width) - 1
-    overflow_cdf_size = (1 << overflow_width) + 1
-    overflow_cdf = np.arange(overflow_cdf_size, dtype=np.uint64)
+    overflow_push, overflow_pop = _overflow_codec(overflow_width)
 
-    enc_statfun_overflow = _indexed_cdf_to_enc_statfun(overflow_cdf)
-    dec_statfun_overflow = _indexed_cdf_to_dec_statfun(overflow_cdf,
-        len(overflow_cdf))
-    overflow_push, overflow_pop = base_codec(enc_statfun_overflow,
-        dec_statfun_overflow, overflow_width)
+    # One codec per distinct CDF row, shared by all symbols using it
+    codec_cache = {}
 
     for i in range(len(indices)):
 
-        cdf_index = indices[i]
-        cdf_i = cdf[cdf_index]
-        cdf_length_i = cdf_length[cdf_index]
+        cdf_index = int(indices[i])
 
-        assert (cdf_index >= 0 and cdf_index < cdf.shape[0]), (
-            f"Invalid index {cdf_index} for symbol {i}")
+        cached = codec_cache.get(cdf_index)
+        if cached is None:
+            assert (cdf_index >= 0 and cdf_index < cdf.shape[0]), (
+                f"Invalid index {cdf_index} for symbol {i}")
 
-        max_value = cdf_length_i - 2
+            cdf_i = cdf[cdf_index]
+            cdf_length_i = cdf_length[cdf_index]
+            max_value = cdf_length_i - 2
 
-        assert max_value >= 0 and max_value < cdf.shape[1] - 1, (
-            f"Invalid max length {max_value} for symbol {i}")
+            assert max_value >= 0 and max_value < cdf.shape[1] - 1, (
+                f"Invalid max length {max_value} for symbol {i}")
 
-        # Bin of discrete CDF that value belongs to
-        enc_statfun = _indexed_cdf_to_enc_statfun(cdf_i)
-        dec_statfun = _indexed_cdf_to_dec_statfun(cdf_i, cdf_length_i)
-        symbol_push, symbol_pop = base_codec(enc_statfun, dec_statfun, precision)
+            # Bin of discrete CDF that value belongs to
+            enc_statfun = _indexed_cdf_to_enc_statfun(cdf_i)
+            dec_statfun = _indexed_cdf_to_dec_statfun(cdf_i, cdf_length_i)
+            cached = codec_cache.setdefault(cdf_index,
+                (build_pop(enc_statfun, dec_statfun, precision), max_value))
 
+        symbol_pop, max_value = cached
         message, value = symbol_pop(message)
 
         """
@@ -542,15 +731,12 @@ def ans_index_decoder(encoded, indices, cdf, cdf_length, cdf_offset, precision,
             for j in range(widths):
                 message, val = overflow_pop(message)
                 val = int(val)
-                assert val <= max_overflow
+                if DEBUG:
+                    assert val <= max_overflow
                 overflow |= val << (j * overflow_width)
 
             # Map positive values back to integer values.
-            value = overflow >> 1
-            if (overflow & 1):
-                value = -value - 1
-            else:
-                value += max_value
+            value = _unmap_overflow(overflow, max_value)
         
         symbol = value + cdf_offset[cdf_index]
         decoded[i] = symbol
@@ -575,19 +761,13 @@ def vec_ans_index_decoder(encoded, indices, cdf, cdf_length, cdf_offset, precisi
     cdf_index = indices
 
     max_overflow = (1 << overflow_width) - 1
-    overflow_cdf_size = (1 << overflow_width) + 1
-    overflow_cdf = np.arange(overflow_cdf_size, dtype=np.uint64)[None, :]
-
-    enc_statfun_overflow = _vec_indexed_cdf_to_enc_statfun(overflow_cdf)
-    dec_statfun_overflow = _vec_indexed_cdf_to_dec_statfun(overflow_cdf,
-        np.ones_like(overflow_cdf) * len(overflow_cdf))
-    overflow_codec = base_codec(enc_statfun_overflow,
-        dec_statfun_overflow, overflow_width)
+    overflow_codec = _overflow_codec(overflow_width, vectorize=True)
 
     assert bool(np.all(cdf_index >= 0)) and bool(np.all(cdf_index < cdf.shape[0])), (
         "Invalid index.")
 
-    max_value = cdf_length[cdf_index] - 2
+    # Check the CDF table rows rather than gathering a length per symbol
+    max_value = cdf_length - 2
 
     assert bool(np.all(max_value >= 0)) and bool(np.all(max_value < cdf.shape[1] - 1)), (
         "Invalid max length.")
@@ -605,71 +785,61 @@ def vec_ans_index_decoder(encoded, indices, cdf, cdf_length, cdf_offset, precisi
         coding_shape = cdf_index.shape[1:]
 
 
-    symbols = []
+    symbols = np.empty((len(cdf_index), *coding_shape), dtype=np.int32)
     _, overflow_pop = substack(codec=overflow_codec, view_fun=overflow_view)
 
+    cdf_padded = _pad_cdf_table(cdf, cdf_length)
+
     for i in range(len(cdf_index)):
         cdf_index_i = cdf_index[i]
-        cdf_i = cdf[cdf_index_i]
         cdf_length_i = cdf_length[cdf_index_i]
+        max_value_i = cdf_length_i - 2
 
-        enc_statfun = _vec_indexed_cdf_to_enc_statfun(cdf_i)
-        dec_statfun = _vec_indexed_cdf_to_dec_statfun(cdf_i, cdf_length_i)
-        symbol_push, symbol_pop = base_codec(enc_statfun, dec_statfun, precision)
+        enc_statfun = _vec_indexed_cdf_to_enc_statfun(cdf, cdf_index_i)
+        dec_statfun = _vec_indexed_cdf_to_dec_statfun(cdf_padded, cdf_index_i)
+        symbol_pop = build_pop(enc_statfun, dec_statfun, precision)
 
         message, value = symbol_pop(message)
-
-        max_value_i = cdf_length_i - 2
         of_mask = value == max_value_i
 
         if np.any(of_mask):
-            
+
             message, val = overflow_pop(message, overflow_width, of_mask)
             val = cast2u64(val)
             widths = val
 
+            # Lanes stay active while their width code is still `max_overflow`
             cond_mask = val == max_overflow
             while np.any(cond_mask):
                 message, val = overflow_pop(message, overflow_width, of_mask)
                 val = cast2u64(val)
                 widths = np.where(cond_mask, widths + val, widths)
-                cond_mask = val == max_overflow
+                cond_mask = np.logical_and(cond_mask, val == max_overflow)
 
             overflow = np.zeros_like(val)
-            cond_mask = widths != 0
-            
-            while np.any(cond_mask):
-                counter = 0
+            for j in range(int(np.max(widths))):
                 message, val = overflow_pop(message, overflow_width, of_mask)
                 val = cast2u64(val)
-                assert np.all(val <= max_overflow)
-
-                op = overflow | (val << (counter * overflow_width))
-                overflow = np.where(cond_mask, op, overflow)
-                widths = np.where(cond_mask, widths-1, widths)
-                cond_mask = widths != 0
-                counter += 1
-
-            overflow_broadcast = value
-            overflow_broadcast[of_mask] = overflow
-            overflow = overflow_broadcast
-            value = np.where(of_mask, overflow >> 1, value)
-            cond_mask = np.logical_and(of_mask, overflow & 1)
-            value = np.where(cond_mask, -value - 1, value)
-            cond_mask = np.logical_and(of_mask, np.logical_not(overflow & 1))
-            value = np.where(cond_mask, value + max_value_i, value)
+                if DEBUG:
+                    assert np.all(val <= max_overflow)
+                overflow |= np.where(j < widths, val << np.uint64(j * overflow_width),
+                    np.uint64(0))
+
+            # Map positive values back to integer values.
+            value = value.astype(np.int64)
+            value[of_mask] = _unmap_overflow(overflow.astype(np.int64), max_value_i[of_mask])
 
         symbol = value + cdf_offset[cdf_index_i]
-        symbols.append(symbol)
+        symbols[i] = symbol
 
         
     if B == 1:
-        decoded = compression_utils.reconstitute(np.stack(symbols, axis=0), padded_shape, unfolded_shape)
+        decoded = compression_utils.reconstitute(symbols, padded_shape, unfolded_shape)
 
         if tuple(decoded.shape) != tuple(original_shape):
             decoded = decoded[:, :, :original_shape[2], :original_shape[3]]
     else:
-        decoded = np.stack(symbols, axis=0)
+        decoded = symbols
     return decoded
 
 def ans_encode_decode_test(symbols, decompressed_symbols):
@@ -189,7 +189,7 @@ class PriorEntropyModel(entropy_models.ContinuousEntropyModel):
         symbols = symbols.cpu().numpy()
         indices = indices.cpu().numpy()
 
-        cdf = self.CDF.cpu().numpy().astype('uint32')
+        cdf = self.CDF.cpu().numpy().astype(entropy_coding.cdf_dtype(self.precision))
         cdf_length = self.CDF_length.cpu().numpy()
         cdf_offset = self.CDF_offset.cpu().numpy()
 
@@ -233,7 +233,7 @@ class PriorEntropyModel(entropy_models.ContinuousEntropyModel):
                 raise ValueError('Mean dims mismatch!')
 
         indices = indices.cpu().numpy()
-        cdf = self.CDF.cpu().numpy().astype('uint32')
+        cdf = self.CDF.cpu().numpy().astype(entropy_coding.cdf_dtype(self.precision))
         cdf_length = self.CDF_length.cpu().numpy()
         cdf_offset = self.CDF_offset.cpu().numpy()
 
@@ -357,3 +357,20 @@ if __name__ == '__main__':
     cbits = enc_shape * 32
     print(f'Symbols compressed to {cbits:.1f} bits.')
     print(f'Estimated entropy {bits:.3f} bits.')
+
+    # Out-of-range symbols go through the overflow code - check both coders round-trip
+    bottleneck_of = bottleneck.clone()
+    bottleneck_of[0, 0, 0, 0] = means[0, 0, 0, 0] + 500.
+    bottleneck_of[0, 1, 10, 20] = means[0, 1, 10, 20] - 700.
+    bottleneck_of[0, -1, -1, -1] = means[0, -1, -1, -1] + 70000.
+    bottleneck_of[0, 2, 5, :] = means[0, 2, 5, :] - 40.
+
+    for vectorize_of in (True, False):
+        encoded, coding_shape, rounded = prior_entropy_model.compress(bottleneck_of, means, scales,
+            block_encode=True, vectorize=vectorize_of)
+        decoded, decoded_raw = prior_entropy_model.decompress(encoded, means, scales, 
+            broadcast_shape=toy_shape[2:], coding_shape=coding_shape, block_decode=True,
+            vectorize=vectorize_of)
+        assert torch.equal(decoded_raw, rounded.float()), (
+            f'Overflow round-trip failed, vectorize={vectorize_of}')
+        print(f'Overflow round-trip OK, vectorize={vectorize_of}')
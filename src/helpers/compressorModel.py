@@ -1,4 +1,4 @@
-from compress import prepare_model, prepare_dataloader, compress_and_save, load_and_decompress
+from compress import prepare_model, prepare_dataloader, compress_and_save, load_and_decompress_batch
 from pathlib import Path
 import os
 
@@ -14,7 +14,13 @@ class _Compressor:
         compress_and_save(_Compressor.model, _Compressor.args, loader, output_dir)
 
     def reconstruct(self, file, output_dir):
-        load_and_decompress(_Compressor.model, file, output_dir +'/'+os.path.basename(file)+'.png')
+        self.reconstruct_batch([file], output_dir)
+
+    def reconstruct_batch(self, files, output_dir):
+        if len(files) == 0:
+            return
+        out_paths = [output_dir +'/'+os.path.basename(file)+'.png' for file in files]
+        load_and_decompress_batch(_Compressor.model, files, out_paths)
 
 def Compressor():
     if _Compressor._instance is None:
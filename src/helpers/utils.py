@@ -31,6 +31,12 @@ def get_device(is_gpu=True):
     return torch.device("cuda" if torch.cuda.is_available() and is_gpu
                         else "cpu")
 
+def get_inference_dtype(device):
+    """Reduced precision type for inference on `device`, None if unsupported"""
+    if device.type != 'cuda':
+        return None
+    return torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+
 def get_model_device(model):
     """Return the device where the model sits."""
     return next(model.parameters()).device
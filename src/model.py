@@ -65,6 +65,9 @@ class Model(nn.Module):
         if model_mode == ModelModes.EVALUATION:
             self.entropy_code = True
 
+        # Autocast type for the synthesis transform (Generator), None for float32
+        self.inference_dtype = None
+
         self.Encoder = encoder.Encoder(self.image_dims, self.batch_size, C=self.args.latent_channels,
             channel_norm=self.args.use_channel_norm)
 
@@ -281,7 +284,7 @@ class Model(nn.Module):
             factor = 2 ** n_encoder_downsamples
             x = utils.pad_factor(x, x.size()[2:], factor)
 
-        # Encoder forward pass
+        # Encoder forward pass - kept in float32, its output is rounded directly
         y = self.Encoder(x)
 
         if self.model_mode == ModelModes.EVALUATION and (self.training is False):
@@ -326,13 +329,78 @@ class Model(nn.Module):
         latents_decoded = self.Hyperprior.decompress_forward(compression_output, device=utils.get_device())
 
         # Use quantized latents as input to G
-        reconstruction = self.Generator(latents_decoded)
+        with self._autocast():
+            reconstruction = self.Generator(latents_decoded)
+        reconstruction = reconstruction.float()
+
+        return self._postprocess_reconstruction(reconstruction, compression_output.spatial_shape)
+
+    def decompress_batch(self, compression_outputs, executor=None, max_batch_size=1):
+
+        """
+        Decompress several images. Images of the same size are passed through the 
+        generator together, in batches of at most `max_batch_size` images to bound
+        GPU memory. If an `executor` is given, latents of all images are entropy 
+        decoded on it concurrently, overlapping with generator passes.
+
+        Yields (index into `compression_outputs`, reconstruction) as each batch 
+        finishes.
+        """
+
+        assert self.model_mode == ModelModes.EVALUATION and (self.training is False), (
+            f'Set model mode to {ModelModes.EVALUATION} for decompression.')
+
+        device = utils.get_device()
+        # Grad mode is thread local - decode with the caller's mode
+        inference_mode = torch.is_inference_mode_enabled()
+
+        def _decompress_latents(compression_output):
+            with torch.inference_mode(inference_mode):
+                return self.Hyperprior.decompress_forward(compression_output, device=device)
+
+        if executor is None:
+            latents_decoded = [_decompress_latents(compression_output)
+                for compression_output in compression_outputs]
+        else:
+            latents_decoded = [executor.submit(_decompress_latents, compression_output)
+                for compression_output in compression_outputs]
+
+        # Same image size gives same latent shape. Bin rather than pad, padding 
+        # changes G output near the borders
+        bins = defaultdict(list)
+        for n, compression_output in enumerate(compression_outputs):
+            bins[tuple(compression_output.spatial_shape)].append(n)
+
+        batches = [bin_idx[i:i + max_batch_size] for bin_idx in bins.values()
+            for i in range(0, len(bin_idx), max_batch_size)]
+
+        for batch_idx in batches:
+            latents = [latents_decoded[n] for n in batch_idx]
+            if executor is not None:
+                latents = [future.result() for future in latents]
+
+            with self._autocast():
+                reconstruction = self.Generator(torch.cat(latents, dim=0))
+            reconstruction = reconstruction.float()
+
+            for n, reconstruction_n in zip(batch_idx, 
+                torch.split(reconstruction, [l.size(0) for l in latents], dim=0)):
+                yield n, self._postprocess_reconstruction(reconstruction_n, 
+                    compression_outputs[n].spatial_shape)
+
+    def _autocast(self):
+        # Reduced precision only for the Generator - the Encoder output is quantized
+        # directly, and the hyperprior and entropy models must produce the same CDF 
+        # indices on encoder and decoder
+        return torch.autocast(device_type='cuda', dtype=self.inference_dtype or torch.float16,
+            enabled=self.inference_dtype is not None)
+
+    def _postprocess_reconstruction(self, reconstruction, image_dims):
 
         if self.args.normalize_input_image is True:
             reconstruction = torch.tanh(reconstruction)
 
         # Undo padding
-        image_dims = compression_output.spatial_shape
         reconstruction = reconstruction[:, :, :image_dims[0], :image_dims[1]]
 
         if self.args.normalize_input_image is True: